@@ -2,11 +2,15 @@
     Base classes for config objects and config generating objects for experiments.
 """
 
+import mmap
 import os
 import warnings
 from abc import ABC, abstractclassmethod, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
+from dataclasses import dataclass, field, fields
 from datetime import datetime
+from functools import lru_cache
 from itertools import product
 from pathlib import Path
 
@@ -14,7 +18,52 @@ import wandb
 import yaml
 from jinja2 import Environment, FileSystemLoader
 
+# use the faster LibYAML based loader/dumper if available
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
 
+
+def load_yaml(path: str) -> dict:
+    """Load a YAML file, memory mapping it rather than reading it into a buffer.
+
+    Args:
+        path: Path to YAML file.
+
+    Returns:
+        Contents of the YAML file.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return yaml.load(mm, Loader=SafeLoader)
+
+
+def _write_text(path: Path, content: str) -> None:
+    """Write a string to a file.
+
+    Args:
+        path: Path to file to write to.
+        content: String to write.
+    """
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@lru_cache
+def _get_jinja_env(template_path: str) -> Environment:
+    """Get a (cached) jinja environment for loading templates from a directory.
+
+    Args:
+        template_path: Directory containing the templates.
+
+    Returns:
+        Jinja environment.
+    """
+    return Environment(loader=FileSystemLoader(template_path))
+
+
+@lru_cache(maxsize=2048)
 def create_wandb_names(dataset_name: str, additional_name: str | None = None) -> str:
     """Generates a weights and biases name for a run or group that is not too long.
 
@@ -35,8 +84,10 @@ def create_wandb_names(dataset_name: str, additional_name: str | None = None) ->
         return dataset_name
 
 
+@dataclass(slots=True, kw_only=True)
 class Config(ABC):
-    """Base class for config objects
+    """Base class for config objects. Subclasses should also be dataclasses (with
+    slots=True and kw_only=True).
 
     Attributes:
         model_name: Name of the HuggingFace model to fine-tune.
@@ -53,35 +104,30 @@ class Config(ABC):
         wandb_args: Arguments passed to wandb.init, as well as optionally a "log_model"
             value which will be used to set the WANDB_LOG_MODEL environment variable
             which controls the model artifact saving behaviour.
+        disable_preprocess_cache: Whether HuggingFace datasets caching should be
+            disabled, set from caches["preprocess_cache"] == "tmp" (not an init arg).
     """
 
-    def __init__(
-        self,
-        model_name: str,
-        dataset_name: str,
-        dataset_args: dict | None = None,
-        n_samples: int | None = None,
-        random_state: int | None = None,
-        config_gen_dtime: str | None = None,
-        caches: dict | None = None,
-        wandb_args: dict | None = None,
-        use_wandb: bool = False,
-        run_name: str | None = None,
-    ) -> None:
-        super().__init__()
-        self.model_name = model_name
-        self.dataset_name = dataset_name
-        self.random_state = random_state
-        self.config_gen_dtime = config_gen_dtime
-        self.caches = caches
-        self.use_wandb = use_wandb
-        self.wandb_args = wandb_args or {}
-        if run_name is not None:
-            self.run_name = run_name
-        else:
+    model_name: str
+    dataset_name: str
+    dataset_args: dict | None = None
+    n_samples: int | None = None
+    random_state: int | None = None
+    config_gen_dtime: str | None = None
+    caches: dict | None = None
+    wandb_args: dict | None = None
+    use_wandb: bool = False
+    run_name: str | None = None
+    disable_preprocess_cache: bool = field(init=False, default=False)
+
+    def __post_init__(self) -> None:
+        self.wandb_args = self.wandb_args or {}
+        self.disable_preprocess_cache = (self.caches or {}).get(
+            "preprocess_cache"
+        ) == "tmp"
+        if self.run_name is None:
             self.run_name = create_wandb_names(self.dataset_name, self.model_name)
-        self.dataset_args = dataset_args or {"train_split": "train"}
-        self.n_samples = n_samples
+        self.dataset_args = self.dataset_args or {"train_split": "train"}
         if "image_field" not in self.dataset_args:
             self.dataset_args["image_field"] = "image"
         if "label_field" not in self.dataset_args:
@@ -129,6 +175,8 @@ class Config(ABC):
                 wandb_config["group"] = create_wandb_names(self.dataset_name)
         if "job_type" not in wandb_config:
             raise ValueError("No Job type given")
+        # allows several runs to be logged sequentially from the same process
+        wandb_config.setdefault("reinit", True)
 
         wandb.init(config={"locomoset": self.to_dict()}, **wandb_config)
 
@@ -157,18 +205,16 @@ class Config(ABC):
         Returns:
             FineTuningConfig object.
         """
-        with open(path) as f:
-            config = yaml.safe_load(f)
+        config = load_yaml(path)
         return cls.from_dict(config=config)
 
-    @abstractclassmethod
     def to_dict(self) -> dict:
         """Convert the config to a dict.
 
         Returns:
             Dict representation of the config.
         """
-        raise NotImplementedError
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
 
 
 class TopLevelConfig(ABC):
@@ -205,6 +251,11 @@ class TopLevelConfig(ABC):
         - slurm_template_name: path for jobscript template
         - config_gen_dtime: config generation date-time for keeping track of generated
             configs
+        - joint_design: list of dicts, each defining one combination of the values to
+            vary over, to use instead of taking all combinations of them. Keys are the
+            argument names in the generated configs (e.g. model_name, dataset_name,
+            n_samples, random_state). Any argument not in a dict takes its value from
+            the top level config, which must then not be a list.
     """
 
     def __init__(
@@ -224,6 +275,7 @@ class TopLevelConfig(ABC):
         slurm_template_path: str | None = None,
         slurm_template_name: str | None = None,
         config_gen_dtime: str | None = None,
+        joint_design: list[dict] | None = None,
     ) -> None:
         self.config_type = config_type
         self.config_gen_dtime = config_gen_dtime or datetime.now().strftime(
@@ -246,6 +298,7 @@ class TopLevelConfig(ABC):
             Path("src", "locomoset", "config/").resolve()
         )
         self.slurm_template_name = slurm_template_name or "jobscript_template.sh"
+        self.joint_design = joint_design
 
     @abstractclassmethod
     def from_dict(
@@ -273,8 +326,7 @@ class TopLevelConfig(ABC):
         Returns:
             TopLevelConfig object.
         """
-        with open(path) as f:
-            config = yaml.safe_load(f)
+        config = load_yaml(path)
         return cls.from_dict(config=config, config_type=config_type)
 
     @abstractmethod
@@ -314,18 +366,53 @@ class TopLevelConfig(ABC):
         bask_pars["array_number"] = array_number
         bask_pars["config_type"] = self.config_type
 
-        jenv = Environment(loader=FileSystemLoader(self.slurm_template_path))
-        template = jenv.get_template(self.slurm_template_name)
+        template = _get_jinja_env(self.slurm_template_path).get_template(
+            self.slurm_template_name
+        )
         content = template.render(bask_pars)
         file_name = f"{self.config_type}_jobscript_{self.config_gen_dtime}.sh"
         with open(f"{config_path}/{file_name}", "w") as f:
             f.write(content)
 
+    def _gen_joint_design_dicts(self, sweep_args: dict[str, str]) -> list[dict]:
+        """Generate a list of dictionaries to create single configs from, taking the
+        combinations of the arguments to sweep over from the joint design. Raises a
+        ValueError if an entry contains an argument that isn't swept over.
+
+        Args:
+            sweep_args: Which arguments to sweep over, dict of {name of argument in
+                TopLeveLConfig: name of argument in MetricConfig}
+
+        Returns:
+            List of dictionaries to create single configs from.
+        """
+        param_sweep_dicts = []
+        for design in self.joint_design:
+            unknown_args = sorted(set(design) - set(sweep_args.values()))
+            if unknown_args:
+                raise ValueError(
+                    f"Unknown argument(s) {unknown_args} in joint_design entry "
+                    f"{design}, expected some of {sorted(sweep_args.values())}"
+                )
+            pdict = {}
+            for toplevel_arg, config_arg in sweep_args.items():
+                if config_arg in design:
+                    pdict[config_arg] = copy(design[config_arg])
+                elif isinstance(getattr(self, toplevel_arg), list):
+                    raise ValueError(
+                        f"{config_arg} must be set in every entry of joint_design as "
+                        f"multiple values of {toplevel_arg} were given"
+                    )
+                else:
+                    pdict[config_arg] = copy(getattr(self, toplevel_arg))
+            param_sweep_dicts.append(pdict)
+        return param_sweep_dicts
+
     def _gen_sweep_dicts(
         self, sweep_args: dict[str, str], keep_args: list[str]
     ) -> list[dict]:
         """Generate a list of dictionaries to create single configs from, looping over
-         the specified arguments to sweep over.
+         the specified arguments to sweep over (or the joint design, if set).
 
         Args:
             sweep_args: Which arguments to sweep over, dict of {name of argument in
@@ -336,24 +423,28 @@ class TopLevelConfig(ABC):
         Returns:
             List of dictionaries to create single configs from.
         """
-        sweep_dict = {}
-        # fill sweep dict, ensuring any non-list values are converted to lists
-        for toplevel_arg, config_arg in sweep_args.items():
-            if isinstance(getattr(self, toplevel_arg), list):
-                sweep_dict[config_arg] = copy(getattr(self, toplevel_arg))
-            else:
-                sweep_dict[config_arg] = [copy(getattr(self, toplevel_arg))]
-
-        sweep_dict_keys, sweep_dict_vals = zip(*sweep_dict.items(), strict=False)
-        param_sweep_dicts = [
-            dict(zip(sweep_dict_keys, v, strict=False))
-            for v in product(*list(sweep_dict_vals))
-        ]
+        if self.joint_design is not None:
+            param_sweep_dicts = self._gen_joint_design_dicts(sweep_args)
+        else:
+            sweep_dict = {}
+            # fill sweep dict, ensuring any non-list values are converted to lists
+            for toplevel_arg, config_arg in sweep_args.items():
+                vals = getattr(self, toplevel_arg)
+                if isinstance(vals, list):
+                    sweep_dict[config_arg] = list(vals)
+                else:
+                    sweep_dict[config_arg] = [vals]
+
+            keys = tuple(sweep_dict)
+            param_sweep_dicts = [
+                dict(zip(keys, combo, strict=True))
+                for combo in product(*sweep_dict.values())
+            ]
 
         # argument in TopLevelMetricsConfig to keep unchanged in MetricsConfig
+        keep_vals = {arg: getattr(self, arg) for arg in keep_args}
         for pdict in param_sweep_dicts:
-            for arg in keep_args:
-                pdict[arg] = getattr(self, arg)
+            pdict.update(keep_vals)
 
         self.num_configs = len(param_sweep_dicts)
         if self.num_configs > 1001:
@@ -364,11 +455,17 @@ class TopLevelConfig(ABC):
         """Save the generated subconfigs to a top level director given by the config
         directory and a specific directory given by the date time that the configs have
         been generated"""
-        configs_path = f"{self.config_dir}/{self.config_gen_dtime}"
-        os.makedirs(configs_path, exist_ok=True)
-        for idx, config in enumerate(self.sub_configs):
-            # save with +1 as slurm array jobs index from 1 not 0!
-            with open(
-                f"{configs_path}/config_{self.config_type}_{idx+1}.yaml", "w"
-            ) as f:
-                yaml.safe_dump(config.to_dict(), f)
+        configs_path = Path(self.config_dir, self.config_gen_dtime)
+        configs_path.mkdir(parents=True, exist_ok=True)
+        payloads = [
+            yaml.dump(config.to_dict(), Dumper=SafeDumper)
+            for config in self.sub_configs
+        ]
+        # save with +1 as slurm array jobs index from 1 not 0!
+        paths = [
+            configs_path / f"config_{self.config_type}_{idx+1}.yaml"
+            for idx in range(len(payloads))
+        ]
+        # writing is I/O bound so use threads to overlap file open/close latency
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(_write_text, paths, payloads))
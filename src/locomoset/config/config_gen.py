@@ -5,9 +5,7 @@
 import argparse
 import shutil
 
-import yaml
-
-from locomoset.config.config_classes import TopLevelConfig
+from locomoset.config.config_classes import TopLevelConfig, load_yaml
 from locomoset.metrics.classes import TopLevelMetricConfig
 from locomoset.models.classes import TopLevelFineTuningConfig
 
@@ -44,8 +42,7 @@ def main():
     args = parser.parse_args()
 
     # Read in config from yaml, initialise alt config
-    with open(args.configfile) as f:
-        config_dict = yaml.safe_load(f)
+    config_dict = load_yaml(args.configfile)
     alt_config = None
 
     # Set argument type
@@ -1,6 +1,12 @@
 import datasets
+import numpy as np
 
-from locomoset.datasets.preprocess import drop_images_by_labels, encode_labels
+from locomoset.datasets.preprocess import (
+    _data_split_indices,
+    _nested_subset_indices,
+    drop_images_by_labels,
+    encode_labels,
+)
 
 
 def load_dataset(
@@ -59,3 +65,59 @@ def load_dataset(
         dataset = drop_images_by_labels(dataset, keep_labels)
 
     return dataset
+
+
+def build_metric_dataset(
+    dataset_name: str,
+    dataset_args: dict,
+    n_samples: int | None,
+    metrics_samples: int | None,
+    random_state: int | None = None,
+    cache_dir: str | None = None,
+) -> tuple[datasets.Dataset, np.ndarray]:
+    """Loads a dataset and creates the subset of its train split to compute metrics
+    with. The subset is identical to the result of calling create_data_splits, taking
+    the train split, and then calling drop_images to reduce it to n_samples and then
+    metrics_samples, but all the indices are computed from the labels first so that
+    only one subset is selected from the loaded dataset.
+
+    Args:
+        dataset_name: Name or path of the dataset to load.
+        dataset_args: Dataset selection/filtering parameters, see the docstring of the
+            base Config class.
+        n_samples: No. samples in the whole training dataset (or None to use the whole
+            train split).
+        metrics_samples: No. samples to compute metrics with (a subset of the n_samples
+            training samples, or all of them if None).
+        random_state: Seed for splitting and subsetting the dataset.
+        cache_dir: Path to the cache directory.
+
+    Returns:
+        HuggingFace Dataset of samples to compute metrics with, and their labels.
+    """
+    dataset = load_dataset(
+        dataset_name,
+        cache_dir=cache_dir,
+        image_field=dataset_args["image_field"],
+        label_field=dataset_args["label_field"],
+        keep_labels=dataset_args["keep_labels"],
+    )
+    train_dataset, train_idx = _data_split_indices(
+        dataset,
+        train_split=dataset_args["train_split"],
+        val_split=dataset_args["val_split"],
+        test_split=dataset_args["test_split"],
+        random_state=random_state,
+        val_size=dataset_args["val_size"],
+        test_size=dataset_args["test_size"],
+    )[dataset_args["train_split"]]
+
+    labels = train_dataset.with_format("numpy")["label"]
+    if train_idx is None:
+        train_idx = np.arange(len(labels))
+    metrics_idx = train_idx[
+        _nested_subset_indices(
+            labels[train_idx], [n_samples, metrics_samples], seed=random_state
+        )[-1]
+    ]
+    return train_dataset.select(metrics_idx, keep_in_memory=True), labels[metrics_idx]
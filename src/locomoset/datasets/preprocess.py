@@ -2,7 +2,12 @@
 Helper functions for preprocessing datasets.
 """
 
+import warnings
+from math import ceil, floor
+
+import numpy as np
 from datasets import ClassLabel, Dataset, DatasetDict
+from datasets.utils.stratify import stratified_shuffle_split_generate_indices
 from transformers.image_processing_utils import BaseImageProcessor
 from transformers.image_utils import load_image
 
@@ -85,6 +90,125 @@ def drop_images(
     )
 
 
+def _train_test_split_indices(
+    labels: np.ndarray,
+    train_size: float | int | None = None,
+    test_size: float | int | None = None,
+    seed: int | None = None,
+    stratify: bool = True,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Computes the indices of a random train/test split of samples, optionally
+    stratified by label. For a given (not None) seed the indices are identical to those
+    that would be selected by HuggingFace's Dataset.train_test_split with the same
+    arguments, so splits computed here are consistent with splits made with the
+    datasets library directly. If seed is None the split is random but not the same
+    as train_test_split's (which draws its seed from NumPy's global random state).
+
+    Args:
+        labels: Label of each sample (only used if stratify is True)
+        train_size: Percentage or number of samples in the train split (or the
+            complement of test_size if None)
+        test_size: Percentage or number of samples in the test split (or the
+            complement of train_size if None, or 0.25 if both are None)
+        seed: Seed for splitting (fresh OS entropy is used if None)
+        stratify: Whether to preserve the label distribution in both splits
+
+    Returns:
+        Indices of the samples in the train split and in the test split
+    """
+    n = len(labels)
+    if train_size is None and test_size is None:
+        test_size = 0.25  # default used by Dataset.train_test_split
+    if isinstance(test_size, float):
+        n_test = ceil(test_size * n)
+    if isinstance(test_size, int):
+        n_test = test_size
+    if isinstance(train_size, float):
+        n_train = floor(train_size * n)
+    if isinstance(train_size, int):
+        n_train = train_size
+    if train_size is None:
+        n_train = n - n_test
+    if test_size is None:
+        n_test = n - n_train
+    if n_train + n_test > n:
+        raise ValueError(
+            f"The sum of train_size and test_size = {n_train + n_test}, should be "
+            f"smaller than the number of samples {n}."
+        )
+
+    rng = np.random.default_rng(seed)
+    if not stratify:
+        permutation = rng.permutation(n)
+        return permutation[n_test : n_test + n_train], permutation[:n_test]
+
+    try:
+        return next(
+            stratified_shuffle_split_generate_indices(labels, n_train, n_test, rng)
+        )
+    except ValueError as error:
+        if str(error) == "Minimum class count error":
+            raise ValueError(
+                "The least populated class in label column has only 1 member, which is "
+                "too few. The minimum number of groups for any class cannot be less "
+                "than 2."
+            ) from error
+        raise error
+
+
+def _nested_subset_indices(
+    labels: np.ndarray,
+    sizes: list[float | int | None],
+    seed: int | None = None,
+    stratify: bool = True,
+) -> list[np.ndarray]:
+    """Computes the indices of a sequence of nested random subsets of samples (each a
+    subset of the previous one), each selected as drop_images would. The first subset
+    is identical to the output of drop_images with the same seed.
+
+    If a subset can't be stratified because a class in the previous subset has only
+    one member, it is created with a random (unstratified) split instead.
+
+    Args:
+        labels: Label of each sample
+        sizes: Percentage or number of samples to keep in each subset (or all of the
+            previous subset if None)
+        seed: Seed for selecting samples
+        stratify: Whether to preserve the label distribution in the subsets
+
+    Returns:
+        Indices (into labels) of the samples in each subset
+    """
+    subset_indices = []
+    keep_idx = np.arange(len(labels))
+    for size in sizes:
+        n = len(keep_idx)
+        if size is None or size == n:
+            subset_indices.append(keep_idx)
+            continue
+        if size > n:
+            raise ValueError(f"keep_size ({size}) is greater than dataset size ({n})")
+        try:
+            sub_idx, _ = _train_test_split_indices(
+                labels[keep_idx], train_size=size, seed=seed, stratify=stratify
+            )
+        except ValueError as error:
+            if not str(error).startswith(
+                "The least populated class in label column has only 1 member"
+            ):
+                raise error
+            warnings.warn(
+                "A subset has only one sample of some classes so can't be further "
+                "subsetted with stratification. A random split has been used instead."
+            )
+            sub_idx, _ = _train_test_split_indices(
+                labels[keep_idx], train_size=size, seed=seed, stratify=False
+            )
+        keep_idx = keep_idx[sub_idx]
+        subset_indices.append(keep_idx)
+    return subset_indices
+
+
 def _drop_images_by_labels(
     dataset: Dataset,
     keep_labels: list[str] | list[int],
@@ -259,7 +383,7 @@ def _percent_to_size(
     return size
 
 
-def create_data_splits(
+def _data_split_indices(
     dataset: Dataset | DatasetDict,
     train_split: str,
     val_split: str,
@@ -267,21 +391,9 @@ def create_data_splits(
     random_state: int | None,
     val_size: float | int | None,
     test_size: float | int | None,
-) -> DatasetDict:
-    """
-    Takes a Dataset or DatasetDict, and transforms it into a DatasetDict with
-    exactly three splits.
-
-    If a Dataset (or DatasetDict with only one split), will split into three,
-    using train_split, val_split, and test_split as the split names.
-
-    If a two split DatasetDict (NOTE train_split must always be one of them), will
-    turn into a three split DatasetDict. Note 'size' as a percentage will always
-    correspond to the whole dataset (i.e. train + val + test), so 0.15 is 15% of the
-    whole. The new split is always created from train. The remaining split should
-    already exist in the dataset.
-
-    If three splits already exist, returns the original DatasetDict.
+) -> dict[str, tuple[Dataset, np.ndarray | None]]:
+    """Computes the train/val/test splits created by create_data_splits (see its
+    docstring for details) as indices, without selecting them from the dataset.
 
     Args:
         dataset: Dataset or DatasetDict to produce a train/val/split from
@@ -295,70 +407,59 @@ def create_data_splits(
             test_split is in dataset
 
     Returns:
-        A DatasetDict with three splits, with names corresponding to those
-        passed in
+        Dict of {split name: (Dataset, indices)}, where indices are the indices of the
+        samples in the split within the Dataset (or None if the split is the whole
+        Dataset).
     """
     # Scenario 1: a dataset or dataset dict w/ only one split
     if isinstance(dataset, DatasetDict) and len(dataset) == 1:
         dataset = dataset[list(dataset.keys())[0]]
     if isinstance(dataset, Dataset):
         n = dataset.num_rows
-        val_size = _percent_to_size(val_size, n)
-        test_size = _percent_to_size(test_size, n)
-        train_and_test = dataset.train_test_split(
-            stratify_by_column="label",
-            test_size=test_size,
-            seed=random_state,
+        labels = dataset.with_format("numpy")["label"]
+        train_and_val_idx, test_idx = _train_test_split_indices(
+            labels, test_size=_percent_to_size(test_size, n), seed=random_state
         )
-        train_and_val = train_and_test["train"].train_test_split(
-            stratify_by_column="label",
-            test_size=val_size,
+        train_idx, val_idx = _train_test_split_indices(
+            labels[train_and_val_idx],
+            test_size=_percent_to_size(val_size, n),
             seed=random_state,
         )
-        return DatasetDict(
-            {
-                train_split: train_and_val["train"],
-                val_split: train_and_val["test"],
-                test_split: train_and_test["test"],
-            }
-        )
+        return {
+            train_split: (dataset, train_and_val_idx[train_idx]),
+            val_split: (dataset, train_and_val_idx[val_idx]),
+            test_split: (dataset, test_idx),
+        }
 
     # Scenario 2: a dataset dict w/ two splits
     if len(dataset) == 2:
+        labels = dataset["train"].with_format("numpy")["label"]
         # Assume either val split or test split is missing: create the other accordingly
         if val_split in dataset.keys():
             test_size = _percent_to_size(
                 test_size, dataset[train_split].num_rows + dataset[val_split].num_rows
             )
-            train_and_test = dataset["train"].train_test_split(
-                stratify_by_column="label",
-                test_size=test_size,
-                seed=random_state,
-            )
-            return DatasetDict(
-                {
-                    train_split: train_and_test["train"],
-                    val_split: dataset[val_split],
-                    test_split: train_and_test["test"],
-                }
+            train_idx, test_idx = _train_test_split_indices(
+                labels, test_size=test_size, seed=random_state
             )
+            return {
+                train_split: (dataset["train"], train_idx),
+                val_split: (dataset[val_split], None),
+                test_split: (dataset["train"], test_idx),
+            }
 
         if test_split in dataset.keys():
             val_size = _percent_to_size(
                 val_size, dataset[train_split].num_rows + dataset[test_split].num_rows
             )
-            train_and_val = dataset["train"].train_test_split(
-                stratify_by_column="label",
-                test_size=val_size,
-                seed=random_state,
-            )
-            return DatasetDict(
-                {
-                    train_split: train_and_val["train"],
-                    val_split: train_and_val["test"],
-                    test_split: dataset[test_split],
-                }
+            train_idx, val_idx = _train_test_split_indices(
+                labels, test_size=val_size, seed=random_state
             )
+            return {
+                train_split: (dataset["train"], train_idx),
+                val_split: (dataset["train"], val_idx),
+                test_split: (dataset[test_split], None),
+            }
 
         raise ValueError(
             "One of val_split or test_split should exist in the dataset dict. "
@@ -368,7 +469,66 @@ def create_data_splits(
         )
 
     # Scenario 3: a dataset dict w/ all three splits already
-    return dataset
+    return {split: (dataset[split], None) for split in dataset}
+
+
+def create_data_splits(
+    dataset: Dataset | DatasetDict,
+    train_split: str,
+    val_split: str,
+    test_split: str,
+    random_state: int | None,
+    val_size: float | int | None,
+    test_size: float | int | None,
+) -> DatasetDict:
+    """
+    Takes a Dataset or DatasetDict, and transforms it into a DatasetDict with
+    exactly three splits.
+
+    If a Dataset (or DatasetDict with only one split), will split into three,
+    using train_split, val_split, and test_split as the split names.
+
+    If a two split DatasetDict (NOTE train_split must always be one of them), will
+    turn into a three split DatasetDict. Note 'size' as a percentage will always
+    correspond to the whole dataset (i.e. train + val + test), so 0.15 is 15% of the
+    whole. The new split is always created from train. The remaining split should
+    already exist in the dataset.
+
+    If three splits already exist, returns the original DatasetDict.
+
+    Args:
+        dataset: Dataset or DatasetDict to produce a train/val/split from
+        train_split: Name of the training split to use/generate
+        val_split: Name of the training split to use/generate
+        test_split: Name of the training split to use/generate
+        random_state: Seed for splitting
+        val_size: Percentage or size of the val set. Is ignored/can be None if
+            val_split is in dataset
+        test_size: Percentage or size of the test set. Is ignored/can be None if
+            test_split is in dataset
+
+    Returns:
+        A DatasetDict with three splits, with names corresponding to those
+        passed in
+    """
+    if isinstance(dataset, DatasetDict) and len(dataset) == 3:
+        return dataset
+
+    split_indices = _data_split_indices(
+        dataset,
+        train_split=train_split,
+        val_split=val_split,
+        test_split=test_split,
+        random_state=random_state,
+        val_size=val_size,
+        test_size=test_size,
+    )
+    return DatasetDict(
+        {
+            split: split_dataset if indices is None else split_dataset.select(indices)
+            for split, (split_dataset, indices) in split_indices.items()
+        }
+    )
 
 
 def select_data_splits(dataset: DatasetDict, keys: list[str]) -> DatasetDict:
@@ -4,6 +4,7 @@ Base metric class for unifying the method.
 
 import warnings
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 
 import numpy as np
 
@@ -112,6 +113,7 @@ class TaskSpecificMetric(Metric):
         return self.metric_function(model_input, dataset_input)
 
 
+@dataclass(slots=True, kw_only=True)
 class MetricConfig(Config):
     """Metric configuration class.
 
@@ -138,46 +140,22 @@ class MetricConfig(Config):
         device: Which device to run inference on
     """
 
-    def __init__(
-        self,
-        model_name: str,
-        dataset_name: str,
-        metrics: list[str],
-        metric_kwargs: dict,
-        save_dir: str | None = None,
-        dataset_args: str | None = None,
-        run_name: str | None = None,
-        n_samples: int | None = None,
-        metrics_samples: int | None = None,
-        random_state: int | None = None,
-        use_wandb: bool = False,
-        wandb_args: dict | None = None,
-        local_save: bool = False,
-        config_gen_dtime: str | None = None,
-        caches: dict | None = None,
-        device: str | None = None,
-    ) -> None:
-        super().__init__(
-            model_name=model_name,
-            dataset_name=dataset_name,
-            dataset_args=dataset_args,
-            n_samples=n_samples,
-            run_name=run_name,
-            random_state=random_state,
-            use_wandb=use_wandb,
-            wandb_args=wandb_args,
-            config_gen_dtime=config_gen_dtime,
-            caches=caches,
-        )
-        self.metrics = metrics
-        self.metric_kwargs = metric_kwargs if metric_kwargs is not None else {}
+    metrics: list[str]
+    metric_kwargs: dict | None
+    save_dir: str | None = None
+    metrics_samples: int | None = None
+    local_save: bool = False
+    device: str | None = None
+
+    def __post_init__(self) -> None:
+        # super() without arguments doesn't work in dataclasses with slots=True
+        super(MetricConfig, self).__post_init__()
+        if self.metric_kwargs is None:
+            self.metric_kwargs = {}
         # `or n_samples` below to default to using whole train set if metrics_samples
         # is None
-        self.metrics_samples = metrics_samples or n_samples
-        self.save_dir = save_dir
-        self.local_save = local_save
+        self.metrics_samples = self.metrics_samples or self.n_samples
         self.wandb_args["job_type"] = "metrics"
-        self.device = device
 
     @classmethod
     def from_dict(cls, config: dict) -> "MetricConfig":
@@ -212,31 +190,6 @@ class MetricConfig(Config):
             device=config.get("device"),
         )
 
-    def to_dict(self) -> dict:
-        """Convert the config to a dict.
-
-        Returns:
-            Dict representation of the config.
-        """
-        return {
-            "model_name": self.model_name,
-            "dataset_name": self.dataset_name,
-            "dataset_args": self.dataset_args,
-            "metrics": self.metrics,
-            "metric_kwargs": self.metric_kwargs,
-            "save_dir": self.save_dir,
-            "n_samples": self.n_samples,
-            "metrics_samples": self.metrics_samples,
-            "run_name": self.run_name,
-            "random_state": self.random_state,
-            "use_wandb": self.use_wandb,
-            "wandb_args": self.wandb_args,
-            "config_gen_dtime": self.config_gen_dtime,
-            "local_save": self.local_save,
-            "caches": self.caches,
-            "device": self.device,
-        }
-
 
 class TopLevelMetricConfig(TopLevelConfig):
     """Takes a YAML file or dictionary with a top level config class containing all
@@ -277,6 +230,9 @@ class TopLevelMetricConfig(TopLevelConfig):
         - config_gen_dtime: config generation date-time for keeping track of generated
             configs
         - inference_args: arguments required for inference in the metric experiments.
+        - joint_design: combinations of values to vary over, to use instead of all
+            combinations of the values given. See the base TopLevelConfig class for
+            details.
     """
 
     def __init__(
@@ -301,6 +257,7 @@ class TopLevelMetricConfig(TopLevelConfig):
         slurm_template_name: str | None = None,
         config_gen_dtime: str | None = None,
         inference_args: dict | None = None,
+        joint_design: list[dict] | None = None,
     ) -> None:
         super().__init__(
             config_type,
@@ -318,6 +275,7 @@ class TopLevelMetricConfig(TopLevelConfig):
             slurm_template_path,
             slurm_template_name,
             config_gen_dtime,
+            joint_design,
         )
         self.metrics = metrics
         self.metrics_samples = metrics_samples
@@ -341,7 +299,8 @@ class TopLevelMetricConfig(TopLevelConfig):
 
                     Can also contain "random_states", "n_samples", "caches",
                     "metric_kwargs", "dataset_args", "config_gen_dtime",
-                    "use_wandb", "wandb_args", "use_bask", and "bask" keys. If
+                    "use_wandb", "wandb_args", "use_bask", "bask" and "joint_design"
+                    keys. If
                     "use_wandb" is not specified, it is set to True if "wandb"
                     is in the config dict.
             config_type (optional): pass the config type to the class constructor
@@ -385,6 +344,7 @@ class TopLevelMetricConfig(TopLevelConfig):
             slurm_template_name=config["slurm_template_name"],
             config_gen_dtime=config["config_gen_dtime"],
             inference_args=config["inference_args"],
+            joint_design=config.get("joint_design"),
         )
 
     def parameter_sweep(self) -> list[dict]:
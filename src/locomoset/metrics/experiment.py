@@ -6,26 +6,133 @@ any parameters required by said metrics.
 Model inference here is done by pipline.
 """
 
+import hashlib
 import json
+import multiprocessing
 import os
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from glob import glob
+from itertools import count
+from tempfile import NamedTemporaryFile
 from time import time
 from typing import Tuple
 
 import datasets
+import numpy as np
 import torch
 import wandb
 from numpy.typing import ArrayLike
+from transformers.image_processing_utils import BaseImageProcessor
 from transformers.modeling_utils import PreTrainedModel
 
-from locomoset.datasets.load import load_dataset
-from locomoset.datasets.preprocess import create_data_splits, drop_images
+from locomoset.datasets.load import build_metric_dataset
 from locomoset.metrics.classes import Metric, MetricConfig
 from locomoset.metrics.library import METRICS
 from locomoset.models.features import get_features
 from locomoset.models.load import get_model_without_head, get_processor
 
+# Results file names are made unique by a per-process prefix (date-time and process ID)
+# and a counter of experiments run in this process.
+_run_prefix = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+_run_counter = count()
+
+
+# Models and processors are cached per process so that consecutive experiments in a
+# sweep with the same model don't reload it from disk each time.
+@lru_cache(maxsize=2)
+def _load_model(model_name: str, cache: str | None = None) -> PreTrainedModel:
+    """Cached version of get_model_without_head."""
+    return get_model_without_head(model_name, cache=cache)
+
+
+@lru_cache(maxsize=2)
+def _load_processor(model_name: str, cache: str | None = None) -> BaseImageProcessor:
+    """Cached version of get_processor."""
+    return get_processor(model_name, cache=cache)
+
+
+def clear_model_cache() -> None:
+    """Remove all cached models and processors, releasing any GPU memory they hold."""
+    _load_model.cache_clear()
+    _load_processor.cache_clear()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+# model of the last sweep experiment run in this process, see _run_sweep_config
+_sweep_state = {"model_name": None}
+
+
+def _results_key(config: MetricConfig) -> str:
+    """Generate a key identifying the results of a metric experiment, which is the same
+    for any two configs that will compute the same results.
+
+    Args:
+        config: Metric experiment config.
+
+    Returns:
+        Hash of the config values that determine the experiment results.
+    """
+    key_values = {
+        "model_name": config.model_name,
+        "dataset_name": config.dataset_name,
+        "dataset_args": config.dataset_args,
+        "n_samples": config.n_samples,
+        "metrics_samples": config.metrics_samples,
+        "random_state": config.random_state,
+        "metrics": config.metrics,
+        "metric_kwargs": config.metric_kwargs,
+    }
+    return hashlib.blake2b(
+        json.dumps(key_values, sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
+
+
+def _load_saved_results(config: MetricConfig) -> dict | None:
+    """Load results previously saved by an experiment with the same results key as
+    config, see _results_key. Files that can't be read or parsed are ignored.
+
+    Args:
+        config: Metric experiment config.
+
+    Returns:
+        The saved results, or None if there are none.
+    """
+    if config.save_dir is None:
+        return None
+    for path in glob(f"{config.save_dir}/results_*_{_results_key(config)}.json"):
+        try:
+            with open(path) as f:
+                results = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            warnings.warn(f"Ignoring unreadable saved results {path}: {e}")
+            continue
+        print(f"Loading previously saved results from {path}")
+        return results
+    return None
+
+
+def _results_to_builtin(results):
+    """Recursively convert numpy scalars in a results dict to built-in Python types, so
+    the results can be serialised and logged without further conversion.
+
+    Args:
+        results: Results dict, or value within it.
+
+    Returns:
+        Results with any numpy scalars replaced with the equivalent Python type.
+    """
+    if isinstance(results, dict):
+        return {key: _results_to_builtin(value) for key, value in results.items()}
+    if isinstance(results, list | tuple):
+        return [_results_to_builtin(value) for value in results]
+    if isinstance(results, np.generic):
+        return results.item()
+    return results
+
 
 class ModelMetricsExperiment:
     """Model experiment class. Runs method metric.fit_metric() for each metric stated,
@@ -61,8 +168,9 @@ class ModelMetricsExperiment:
             )
             for metric in config.metrics
         }
+        # unique inference types, in the order the metrics were given
         self.inference_types = list(
-            set(metric.inference_type for metric in self.metrics.values())
+            dict.fromkeys(metric.inference_type for metric in self.metrics.values())
         )
 
         # Caches
@@ -75,67 +183,21 @@ class ModelMetricsExperiment:
         if self.device == "cuda":
             self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-        # Load/generate dataset
+        # Load dataset and create the metrics dataset, a subset of n_samples of the
+        # train split, which is further subset to metrics_samples
         print("Generating data sample...")
         self.dataset_name = config.dataset_name
-        self.dataset = load_dataset(
+        self.n_samples = config.n_samples
+        self.metrics_samples = config.metrics_samples
+        self.dataset, self.labels = build_metric_dataset(
             self.dataset_name,
-            image_field=config.dataset_args["image_field"],
-            label_field=config.dataset_args["label_field"],
-            cache_dir=self.dataset_cache,
-            keep_labels=config.dataset_args["keep_labels"],
-        )
-
-        # Prepare splits
-        self.dataset = create_data_splits(
-            self.dataset,
-            train_split=config.dataset_args["train_split"],
-            val_split=config.dataset_args["val_split"],
-            test_split=config.dataset_args["test_split"],
+            config.dataset_args,
+            n_samples=self.n_samples,
+            metrics_samples=self.metrics_samples,
             random_state=config.random_state,
-            val_size=config.dataset_args["val_size"],
-            test_size=config.dataset_args["test_size"],
-        )
-
-        # Grab train split
-        self.dataset = self.dataset[config.dataset_args["train_split"]]
-
-        # Take subset to create whole train dataset
-        self.n_samples = config.n_samples
-        self.dataset = drop_images(
-            self.dataset,
-            keep_size=self.n_samples,
-            seed=config.random_state,
+            cache_dir=self.dataset_cache,
         )
 
-        # Further subset train dataset to create metrics dataset
-        self.metrics_samples = config.metrics_samples
-        try:
-            self.dataset = drop_images(
-                self.dataset,
-                keep_size=self.metrics_samples,
-                seed=config.random_state,
-            )
-        except ValueError as error:
-            if str(error).startswith(
-                "The least populated class in label column has only 1 member"
-            ):
-                warnings.warn(
-                    "The train set has only one sample of some classes so can't be "
-                    "further subsetted with stratification to create the metrics set. "
-                    "A random split has been used instead."
-                )
-                self.dataset = drop_images(
-                    self.dataset,
-                    keep_size=self.metrics_samples,
-                    seed=config.random_state,
-                    stratify_by_column=None,
-                )
-            else:
-                raise error
-
-        self.labels = self.dataset["label"]
-
         # Initialise results dict
         self.results = config.to_dict()
         self.results["inference_times"] = {}
@@ -143,8 +205,10 @@ class ModelMetricsExperiment:
 
         self.save_dir = config.save_dir
         os.makedirs(self.save_dir, exist_ok=True)
-        date_str = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
-        self.save_path = f"{self.save_dir}/results_{date_str}.json"
+        self.save_path = (
+            f"{self.save_dir}/results_{_run_prefix}_{next(_run_counter)}_"
+            f"{_results_key(config)}.json"
+        )
 
     def features_inference(self) -> ArrayLike:
         """Perform inference for features based methods.
@@ -153,8 +217,8 @@ class ModelMetricsExperiment:
             Features generated by the model with its classification head removed on the
                 test dataset.
         """
-        model_fn = get_model_without_head(self.model_name, cache=self.model_cache)
-        processor = get_processor(self.model_name, cache=self.model_cache)
+        model_fn = _load_model(self.model_name, cache=self.model_cache)
+        processor = _load_processor(self.model_name, cache=self.model_cache)
         return get_features(self.dataset, processor, model_fn, device=self.device)
 
     def model_inference(self) -> PreTrainedModel:
@@ -163,7 +227,7 @@ class ModelMetricsExperiment:
         Returns:
             Model with its classification head removed.
         """
-        return get_model_without_head(self.model_name, cache=self.model_cache)
+        return _load_model(self.model_name, cache=self.model_cache)
 
     def perform_inference(
         self, inference_type: str | None
@@ -248,10 +312,17 @@ class ModelMetricsExperiment:
                 self.results["metric_scores"][metric]["score"] = score
                 self.results["metric_scores"][metric]["time"] = metric_time
 
+        self.results = _results_to_builtin(self.results)
+
     def save_results(self) -> None:
-        """Save the experiment results to self.save_path."""
-        with open(self.save_path, "w") as f:
-            json.dump(self.results, f, default=float)
+        """Save the experiment results to self.save_path. The results are written to a
+        temporary file first, so a job killed while saving doesn't leave a truncated
+        results file behind."""
+        with NamedTemporaryFile(
+            "w", dir=self.save_dir, prefix=".results_", suffix=".tmp", delete=False
+        ) as f:
+            json.dump(self.results, f)
+        os.replace(f.name, self.save_path)
         print(f"Results saved to {self.save_path}")
 
     def log_wandb_results(self) -> None:
@@ -262,8 +333,12 @@ class ModelMetricsExperiment:
 
 def run_config(config: MetricConfig):
     """Run comparative metric experiment for a given pair (model, dataset) for stated
-    metrics. Results saved to file path of form results/results_YYYYMMDD-HHMMSS.json by
-    default.
+    metrics. Results saved to file path of form
+    results/results_YYYYMMDD-HHMMSS-PID_N_KEY.json by default, where KEY is a hash of
+    the config values that determine the results. If results with the same key have
+    already been saved they are loaded (and logged to wandb) rather than being
+    recomputed. Disabling the datasets cache (caches["preprocess_cache"] == "tmp") is
+    left to the caller, see run_configs.
 
     Args:
         config: Loaded configuration dictionary including the following keys:
@@ -282,8 +357,12 @@ def run_config(config: MetricConfig):
     if config.use_wandb:
         config.init_wandb()
 
-    if config.caches.get("preprocess_cache") == "tmp":
-        datasets.disable_caching()
+    results = _load_saved_results(config)
+    if results is not None:
+        if config.use_wandb:
+            wandb.log(results)
+            wandb.finish()
+        return
 
     model_experiment = ModelMetricsExperiment(config)
     model_experiment.run_experiment()
@@ -294,3 +373,103 @@ def run_config(config: MetricConfig):
     if config.use_wandb:
         print(config.wandb_args)
         model_experiment.log_wandb_results()
+
+
+def _select_batch(configs: list[MetricConfig], batch: str) -> list[MetricConfig]:
+    """Select the subset of configs to run for one batch of a sweep, so that the same
+    set of configs can be split across several jobs (e.g. a slurm array job).
+
+    Args:
+        configs: All configs in the sweep.
+        batch: String of the form "i/n", selecting batch i of n (indexed from 1, as
+            slurm array jobs are).
+
+    Returns:
+        Every n-th config, starting from the i-th.
+    """
+    i, n = (int(b) for b in batch.split("/"))
+    if not 1 <= i <= n:
+        raise ValueError(f"batch must be of the form i/n with 1 <= i <= n, got {batch}")
+    return configs[i - 1 :: n]
+
+
+def _init_worker(
+    device_queue: multiprocessing.Queue, disable_preprocess_cache: bool = False
+) -> None:
+    """Initialise a worker process, restricting it to a single GPU (if any are
+    available) so that workers don't all run on the same device.
+
+    Args:
+        device_queue: Queue of device IDs to take this worker's device from.
+        disable_preprocess_cache: Whether to disable HuggingFace datasets caching in
+            the worker (spawned workers don't inherit the parent's setting).
+    """
+    device_id = device_queue.get()
+    if device_id is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = device_id
+    if disable_preprocess_cache:
+        datasets.disable_caching()
+
+
+def _run_sweep_config(config: MetricConfig) -> None:
+    """Run one experiment of a sweep (see run_config), first clearing the model cache
+    if the previous experiment run in this process used a different model, so that
+    each process only holds the models it still needs.
+
+    Args:
+        config: Config to run.
+    """
+    previous_model_name = _sweep_state["model_name"]
+    if previous_model_name is not None and config.model_name != previous_model_name:
+        clear_model_cache()
+    _sweep_state["model_name"] = config.model_name
+    run_config(config)
+
+
+def run_configs(
+    configs: list[MetricConfig], n_workers: int = 1, batch: str | None = None
+) -> None:
+    """Run metric experiments for several configs, in parallel if n_workers > 1. Each
+    experiment saves its own results file, so no coordination between workers is
+    needed. HuggingFace datasets caching is disabled once for the whole sweep if any
+    config sets caches["preprocess_cache"] to "tmp".
+
+    Args:
+        configs: Configs to run, see run_config for details.
+        n_workers: Number of processes to run experiments in. If GPUs are available
+            they are assigned to workers round-robin.
+        batch: (Optional) String of the form "i/n" to only run batch i of n of the
+            configs, see _select_batch.
+    """
+    if batch is not None:
+        configs = _select_batch(configs, batch)
+
+    disable_preprocess_cache = any(c.disable_preprocess_cache for c in configs)
+
+    if n_workers == 1:
+        if disable_preprocess_cache:
+            datasets.disable_caching()
+        for config in configs:
+            _run_sweep_config(config)
+        return
+
+    if "CUDA_VISIBLE_DEVICES" in os.environ:
+        devices = os.environ["CUDA_VISIBLE_DEVICES"].split(",")
+    else:
+        devices = [str(idx) for idx in range(torch.cuda.device_count())]
+
+    # spawn rather than fork so CUDA is initialised separately in each worker
+    mp_context = multiprocessing.get_context("spawn")
+    device_queue = mp_context.Queue()
+    for idx in range(n_workers):
+        device_queue.put(devices[idx % len(devices)] if devices else None)
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(device_queue, disable_preprocess_cache),
+    ) as executor:
+        futures = [executor.submit(_run_sweep_config, config) for config in configs]
+        for future in futures:
+            future.result()
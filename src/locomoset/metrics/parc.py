@@ -7,21 +7,84 @@ for accessible transfer learning." Advances in Neural Information Processing Sys
 34 (2021): 19301-19312.
 """
 
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from numbers import Integral
+
 import numpy as np
+from numba import njit, prange
 from numpy.typing import ArrayLike
-from scipy.stats import spearmanr
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from scipy.linalg import LinAlgError, get_blas_funcs, get_lapack_funcs
+from scipy.stats import rankdata
+from sklearn.utils.extmath import randomized_svd, svd_flip
 
 from locomoset.metrics.classes import TaskSpecificMetric
 
+# use cuML's GPU PCA for large feature arrays if it is installed
+try:
+    import cupy
+    from cuml import PCA as GPUPCA
+except ImportError:
+    cupy = None
+
+# reduced features from recent _feature_reduce calls, keyed by a hash of the input
+_FEATURE_REDUCE_CACHE: OrderedDict[tuple, np.ndarray] = OrderedDict()
+_FEATURE_REDUCE_CACHE_SIZE = 8
+
+# arrays at least this size use the numba kernel in _lower_tri_arr
+_NUMBA_MIN_SIZE = 512
+
+# reductions keeping at least this fraction of min(features.shape) use an exact SVD,
+# as in sklearn's PCA
+_EXACT_SVD_RATIO = 0.8
+
+# feature arrays with more elements than this are reduced on the GPU (if available)
+_GPU_MIN_SIZE = 10_000_000
+
+
+@lru_cache
+def _gpu_available() -> bool:
+    """Whether cuML is installed and a CUDA device is available to run it on."""
+    if cupy is None:
+        return False
+    try:
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except cupy.cuda.runtime.CUDARuntimeError:
+        return False
+
+
+def _feature_reduce_gpu(
+    features: np.ndarray, random_state: int, f: int = 32
+) -> np.ndarray:
+    """GPU version of _feature_reduce, using cuML's PCA with the Jacobi solver.
+
+    Args:
+        features: features on which to reduce.
+        random_state: random state passed to cuML's PCA.
+        f: dimension to reduce down to.
+
+    Returns:
+        Reduced features array (on the CPU).
+    """
+    pca = GPUPCA(n_components=f, svd_solver="jacobi", random_state=random_state)
+    return cupy.asnumpy(pca.fit_transform(cupy.asarray(features)))
+
 
-def _feature_reduce(features: np.ndarray, random_state: int, f: int = 32) -> np.ndarray:
-    """Use PCA to reduce the dimensionality of features.
+def _feature_reduce(
+    features: np.ndarray, random_state: int, f: int = 32, centred: bool = False
+) -> np.ndarray:
+    """Use PCA to reduce the dimensionality of features, computed with a randomized
+    SVD truncated to f components of the centred features (or an exact SVD if f is
+    close to min(features.shape)), or on the GPU with cuML for large arrays if it's
+    available. If random_state is an int the (read-only) result is cached, so repeated
+    calls with the same features skip the SVD (see PARCMetric.clear_cache).
 
     Args:
         features: features on which to reduce.
+        random_state: random state for the randomized SVD.
         f: dimension to reduce down to.
+        centred: If True the features already have zero mean, so aren't centred again.
 
     Returns:
         Reduced features array.
@@ -34,12 +97,176 @@ def _feature_reduce(features: np.ndarray, random_state: int, f: int = 32) -> np.
             "Reduced dimension should not be more than minimum features dimension."
         )
 
-    return PCA(
-        n_components=f,
-        svd_solver="randomized",
-        iterated_power=1,
-        random_state=random_state,
-    ).fit_transform(features)
+    # only a fixed seed gives a reproducible result that is safe to reuse
+    cacheable = isinstance(random_state, Integral)
+    if cacheable:
+        key = (
+            hashlib.blake2b(np.ascontiguousarray(features).data).hexdigest(),
+            features.shape,
+            features.dtype.str,
+            random_state,
+            f,
+            centred,
+        )
+        if key in _FEATURE_REDUCE_CACHE:
+            _FEATURE_REDUCE_CACHE.move_to_end(key)
+            return _FEATURE_REDUCE_CACHE[key]
+
+    if features.size > _GPU_MIN_SIZE and _gpu_available():
+        reduced = _feature_reduce_gpu(features, random_state, f)
+    elif f >= _EXACT_SVD_RATIO * min(features.shape):
+        # randomized SVD has no advantage when most components are kept. The centred
+        # copy is made in Fortran order so LAPACK can overwrite it rather than making
+        # another copy (the input features are never overwritten).
+        a = (
+            features
+            if centred
+            else np.subtract(features, features.mean(axis=0), order="F")
+        )
+        gesdd = get_lapack_funcs("gesdd", (a,))
+        U, S, Vt, info = gesdd(
+            a, compute_uv=1, full_matrices=0, overwrite_a=not centred
+        )
+        if info > 0:
+            raise LinAlgError("SVD did not converge")
+        U, _ = svd_flip(U[:, :f], Vt[:f])
+        reduced = U * S[:f]
+    else:
+        U, S, _ = randomized_svd(
+            features if centred else features - features.mean(axis=0),
+            n_components=f,
+            n_iter=1,
+            random_state=random_state,
+        )
+        reduced = U * S
+
+    if cacheable:
+        reduced.setflags(write=False)
+        _FEATURE_REDUCE_CACHE[key] = reduced
+        if len(_FEATURE_REDUCE_CACHE) > _FEATURE_REDUCE_CACHE_SIZE:
+            _FEATURE_REDUCE_CACHE.popitem(last=False)
+    return reduced
+
+
+def _standardize(features: np.ndarray) -> np.ndarray:
+    """Scale each feature to have mean zero and standard deviation one, as with
+    sklearn's StandardScaler but with a single copy of the features.
+
+    Args:
+        features: features of shape (num_samples, num_features).
+
+    Returns:
+        Standardized copy of the features.
+    """
+    scaled = features - features.mean(axis=0)
+    scale = features.std(axis=0)
+    # leave constant features as zeros rather than dividing by zero
+    scale[scale == 0] = 1
+    scaled /= scale
+    return scaled
+
+
+def _corrcoef_rows(arr: np.ndarray, dtype: np.dtype = np.float64) -> np.ndarray:
+    """Pearson correlation coefficients between the rows of a 2 dimensional array,
+    matching np.corrcoef(arr) in the upper triangle. Computed as a symmetric rank-k
+    update (BLAS syrk) of the z-scored rows, which only fills in one triangle, so
+    the values below the diagonal of the result are not meaningful.
+
+    Args:
+        arr: 2 dimensional array of shape (num_rows, num_columns).
+        dtype: dtype to compute the matrix product (and return the result) in.
+
+    Returns:
+        Correlation matrix of shape (num_rows, num_rows), upper triangle and diagonal
+        only.
+    """
+    centred = arr - arr.mean(axis=1, keepdims=True)
+    z = (centred / np.linalg.norm(centred, axis=1, keepdims=True)).astype(
+        dtype, copy=False
+    )
+    syrk = get_blas_funcs("syrk", (z,))
+    # z.T is Fortran ordered so is passed to BLAS without a copy, and filling the
+    # lower triangle then transposing gives the upper triangle of a C ordered array
+    corr = syrk(1.0, z.T, trans=1, lower=1).T
+    return np.clip(corr, -1, 1, out=corr)
+
+
+@lru_cache(maxsize=8)
+def _triu_mask(n: int) -> np.ndarray:
+    """Cached boolean mask of the upper triangle (excluding the diagonal) of an n x n
+    array, so repeated PARC calls with the same number of samples don't rebuild it.
+
+    Args:
+        n: Size of the square array.
+
+    Returns:
+        Read-only (n, n) boolean array, True above the diagonal.
+    """
+    mask = np.triu(np.ones((n, n), dtype=bool), 1)
+    mask.setflags(write=False)
+    return mask
+
+
+@njit(parallel=True, cache=True)
+def _lower_tri_arr_numba(arr: np.ndarray) -> np.ndarray:
+    """Numba version of _lower_tri_arr, which copies the values straight into the
+    output without building a mask or index arrays.
+
+    Args:
+        arr : 2 dimensional square array for value extraction.
+
+    Returns:
+        1 dimensional array of offset lower diagonal values from input array.
+    """
+    n = arr.shape[0]
+    out = np.empty(n * (n - 1) // 2, dtype=arr.dtype)
+    for i in prange(n - 1):
+        # number of values in the rows before row i
+        start = i * (2 * n - i - 1) // 2
+        for j in range(i + 1, n):
+            out[start + j - i - 1] = arr[i, j]
+    return out
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def _fused_tri_spearman(feature_ranks: np.ndarray, labels: np.ndarray) -> float:
+    """Spearman correlation between the ranked upper triangle of the feature distance
+    matrix and the upper triangle of the label distance matrix, without building the
+    label distance matrix.
+
+    The correlation distance between the one-hot encoded labels of two samples only
+    takes two values (0 if the labels match, C / (C - 1) otherwise for C classes), so
+    its ranks are a positive affine function of the indicator "labels differ". The
+    spearman correlation is then the pearson correlation of the feature ranks with
+    that indicator, which is accumulated in a single pass over the sample pairs.
+
+    Args:
+        feature_ranks: Ranks (averaged for ties) of the upper triangle of the feature
+            distance matrix, in the order returned by _lower_tri_arr.
+        labels: Integer label of each sample, of shape (num_samples,).
+
+    Returns:
+        Spearman correlation coefficient (nan if either input is constant).
+    """
+    n = labels.shape[0]
+    m = n * (n - 1) // 2
+    # average ranks of m values always sum to m * (m + 1) / 2
+    mean_rank = (m + 1) / 2
+    sum_sq_ranks = 0.0
+    sum_diff_ranks = 0.0
+    n_diff = 0
+    for i in prange(n - 1):
+        start = i * (2 * n - i - 1) // 2
+        for j in range(i + 1, n):
+            rank = feature_ranks[start + j - i - 1] - mean_rank
+            sum_sq_ranks += rank * rank
+            if labels[i] != labels[j]:
+                sum_diff_ranks += rank
+                n_diff += 1
+    denom = np.sqrt(sum_sq_ranks * n_diff * (m - n_diff) / m)
+    if denom == 0:
+        return np.nan
+    return sum_diff_ranks / denom
 
 
 def _lower_tri_arr(arr: np.ndarray) -> np.ndarray:
@@ -52,8 +279,9 @@ def _lower_tri_arr(arr: np.ndarray) -> np.ndarray:
     Returns:
         1 dimensional array of offset lower diagonal values from input array.
     """
-    n = arr.shape[0]
-    return arr[np.triu_indices(n, 1)]
+    if arr.shape[0] >= _NUMBA_MIN_SIZE:
+        return _lower_tri_arr_numba(arr)
+    return arr[_triu_mask(arr.shape[0])]
 
 
 class PARCMetric(TaskSpecificMetric):
@@ -68,13 +296,17 @@ class PARCMetric(TaskSpecificMetric):
         feat_red_dim: int = 32,
         random_state: int = None,
         scale_features: bool = True,
+        features_standardized: bool = False,
     ) -> None:
         """
         Args:
             feat_red_dim: If set, feature reduction dimension.
             random_state: Random state for dimensionality reduction.
-            scale_features: If True, use StandardScaler to convert features to have mean
-                zero and standard deviation one before computing PARC.
+            scale_features: If True, convert features to have mean zero and standard
+                deviation one (as sklearn's StandardScaler does) before computing PARC.
+            features_standardized: If True, the features passed to the metric are
+                already standardized (mean zero and standard deviation one), so they
+                aren't scaled or centred again.
 
         """
         super().__init__(
@@ -82,6 +314,12 @@ class PARCMetric(TaskSpecificMetric):
         )
         self.feat_red_dim = feat_red_dim
         self.scale_features = scale_features
+        self.features_standardized = features_standardized
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Clear the cache of reduced features shared by all PARCMetric instances."""
+        _FEATURE_REDUCE_CACHE.clear()
 
     def metric_function(self, features: ArrayLike, labels: ArrayLike) -> float:
         """Takes computed features from model for each image in a probe data subset
@@ -100,14 +338,19 @@ class PARCMetric(TaskSpecificMetric):
             features = np.asarray(features)
         if not isinstance(labels, np.ndarray):
             labels = np.asarray(labels)
-        labels = OneHotEncoder(sparse_output=False).fit_transform(
-            labels.reshape((len(labels), 1))
-        )
-        if self.scale_features:
-            features = StandardScaler().fit_transform(features)
-        dist_imgs = 1 - np.corrcoef(
-            _feature_reduce(features, self.random_state, f=self.feat_red_dim)
+        if self.scale_features and not self.features_standardized:
+            features = _standardize(features)
+        # float32 halves the memory traffic of the (num_samples, num_samples) feature
+        # matrix
+        dist_imgs = 1 - _corrcoef_rows(
+            _feature_reduce(
+                features,
+                self.random_state,
+                f=self.feat_red_dim,
+                centred=self.scale_features or self.features_standardized,
+            ),
+            dtype=np.float32,
         )
-        dist_labs = 1 - np.corrcoef(labels)
+        _, label_ids = np.unique(labels.reshape(-1), return_inverse=True)
 
-        return spearmanr(_lower_tri_arr(dist_imgs), _lower_tri_arr(dist_labs))[0] * 100
+        return _fused_tri_spearman(rankdata(_lower_tri_arr(dist_imgs)), label_ids) * 100
@@ -3,12 +3,14 @@ Class for train config
 """
 
 from copy import copy
+from dataclasses import dataclass
 
 from transformers import TrainingArguments
 
 from locomoset.config.config_classes import Config, TopLevelConfig
 
 
+@dataclass(slots=True, kw_only=True)
 class FineTuningConfig(Config):
     """Fine-tuning configuration class.
 
@@ -27,33 +29,12 @@ class FineTuningConfig(Config):
         caches: where to cache the huggingface models and datasets.
     """
 
-    def __init__(
-        self,
-        model_name: str,
-        dataset_name: str,
-        dataset_args: dict | None = None,
-        n_samples: int | None = None,
-        random_state: int | None = None,
-        config_gen_dtime: str | None = None,
-        caches: dict | None = None,
-        wandb_args: dict | None = None,
-        use_wandb: bool = False,
-        run_name: str | None = None,
-        training_args: dict | None = None,
-    ) -> None:
-        super().__init__(
-            model_name,
-            dataset_name,
-            dataset_args,
-            n_samples,
-            random_state,
-            config_gen_dtime,
-            caches,
-            wandb_args,
-            use_wandb,
-            run_name,
-        )
-        self.training_args = training_args or {}
+    training_args: dict | None = None
+
+    def __post_init__(self) -> None:
+        # super() without arguments doesn't work in dataclasses with slots=True
+        super(FineTuningConfig, self).__post_init__()
+        self.training_args = self.training_args or {}
         self.wandb_args["job_type"] = "train"
 
     @classmethod
@@ -98,26 +79,6 @@ class FineTuningConfig(Config):
         training_args["output_dir"] += f"/{self.run_name}"
         return TrainingArguments(**training_args)
 
-    def to_dict(self) -> dict:
-        """Convert the config to a dict.
-
-        Returns:
-            Dict representation of the config.
-        """
-        return {
-            "caches": self.caches,
-            "config_gen_dtime": self.config_gen_dtime,
-            "model_name": self.model_name,
-            "dataset_name": self.dataset_name,
-            "dataset_args": self.dataset_args,
-            "n_samples": self.n_samples,
-            "run_name": self.run_name,
-            "random_state": self.random_state,
-            "training_args": self.training_args,
-            "use_wandb": self.use_wandb,
-            "wandb_args": self.wandb_args,
-        }
-
 
 class TopLevelFineTuningConfig(TopLevelConfig):
     """Takes a YAML file or dictionary with a top level config class containing all
@@ -147,6 +108,9 @@ class TopLevelFineTuningConfig(TopLevelConfig):
             configs
         - dataset_args: dataset arguments for training purposes
         - training_args: arguments for training
+        - joint_design: combinations of values to vary over, to use instead of all
+            combinations of the values given. See the base TopLevelConfig class for
+            details.
     """
 
     def __init__(
@@ -167,6 +131,7 @@ class TopLevelFineTuningConfig(TopLevelConfig):
         slurm_template_path: str | None = None,
         slurm_template_name: str | None = None,
         config_gen_dtime: str | None = None,
+        joint_design: list[dict] | None = None,
     ) -> None:
         super().__init__(
             config_type,
@@ -184,6 +149,7 @@ class TopLevelFineTuningConfig(TopLevelConfig):
             slurm_template_path,
             slurm_template_name,
             config_gen_dtime,
+            joint_design,
         )
         self.training_args = training_args
 
@@ -203,8 +169,8 @@ class TopLevelFineTuningConfig(TopLevelConfig):
 
                     Can also contain "random_states", "dataset_args",
                     "config_gen_dtime", "training_args", "use_wandb", "wandb_args",
-                    "use_bask" and "bask" keys. If "use_wandb" is not specified, it is
-                    set to True if "wandb" is in the config dict.
+                    "use_bask", "bask" and "joint_design" keys. If "use_wandb" is not
+                    specified, it is set to True if "wandb" is in the config dict.
             config_type (optional): pass the config type to the class constructor
                                     explicitly. Defaults to None.
 
@@ -232,6 +198,7 @@ class TopLevelFineTuningConfig(TopLevelConfig):
             training_args=config.get("training_args"),
             use_bask=config.get("use_bask"),
             bask=config.get("bask"),
+            joint_design=config.get("joint_design"),
         )
 
     def parameter_sweep(self) -> list[dict]:
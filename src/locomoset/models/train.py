@@ -99,7 +99,7 @@ def run_config(config: FineTuningConfig) -> Trainer:
     if config.use_wandb:
         config.init_wandb()
 
-    if config.caches.get("preprocess_cache") == "tmp":
+    if config.disable_preprocess_cache:
         disable_caching()
 
     if "tmp_dir" in config.caches and config.caches["tmp_dir"] is not None:
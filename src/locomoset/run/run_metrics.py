@@ -5,18 +5,29 @@ Entry point for running experiments per model for each metric stated in config.
 import argparse
 
 from locomoset.metrics.classes import MetricConfig
-from locomoset.metrics.experiment import run_config
+from locomoset.metrics.experiment import run_configs
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Compute metrics scans with various parameter values"
     )
-    parser.add_argument("configfile", help="Path to config file")
+    parser.add_argument("configfile", nargs="+", help="Path to config file(s)")
+    parser.add_argument(
+        "--n_workers",
+        type=int,
+        default=1,
+        help="Number of processes to run the configs in parallel with",
+    )
+    parser.add_argument(
+        "--batch",
+        default=None,
+        help="Only run batch i of n of the configs, given in the form i/n",
+    )
     args = parser.parse_args()
-    config = MetricConfig.read_yaml(args.configfile)
+    configs = [MetricConfig.read_yaml(path) for path in args.configfile]
 
-    run_config(config)
+    run_configs(configs, n_workers=args.n_workers, batch=args.batch)
 
 
 if __name__ == "__main__":
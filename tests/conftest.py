@@ -10,17 +10,17 @@ from sklearn.preprocessing import OneHotEncoder
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def test_n_features():
     return 5
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def test_n_samples():
     return 1000
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def test_seed():
     return 42
 
@@ -30,30 +30,43 @@ def rng(test_seed):
     return np.random.default_rng(test_seed)
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def dummy_n_classes():
     return 3
 
 
-@pytest.fixture()
-def dummy_labels(rng, dummy_n_classes, test_n_samples):
-    return rng.integers(0, dummy_n_classes, test_n_samples)
+# The numeric fixtures below are generated once per session (each with its own
+# generator so they don't depend on the order tests request them in), and are made
+# read-only so that tests can't modify them for each other.
+@pytest.fixture(scope="session")
+def dummy_labels(test_seed, dummy_n_classes, test_n_samples):
+    labels = np.random.default_rng(test_seed).integers(
+        0, dummy_n_classes, test_n_samples
+    )
+    labels.setflags(write=False)
+    return labels
 
 
-@pytest.fixture()
-def dummy_features_random(rng, test_n_samples, test_n_features):
-    return rng.normal(size=(test_n_samples, test_n_features))
+@pytest.fixture(scope="session")
+def dummy_features_random(test_seed, test_n_samples, test_n_features):
+    features = np.random.default_rng(test_seed + 1).normal(
+        size=(test_n_samples, test_n_features)
+    )
+    features.setflags(write=False)
+    return features
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def dummy_features_perfect(dummy_labels, test_n_samples):
     """
     Returns features perfectly correlated with the dummy_labels (one-hot encoded
     labels).
     """
-    return OneHotEncoder(sparse_output=False).fit_transform(
+    features = OneHotEncoder(sparse_output=False).fit_transform(
         dummy_labels.reshape((test_n_samples, 1))
     )
+    features.setflags(write=False)
+    return features
 
 
 @pytest.fixture()
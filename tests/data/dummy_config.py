@@ -3,7 +3,6 @@ Load config dict used across the dummy generation scripts.
 """
 from __future__ import annotations
 
-import yaml
+from locomoset.config.config_classes import load_yaml
 
-with open("dummy_model_config.yaml") as f:
-    config = yaml.safe_load(f)
+config = load_yaml("dummy_model_config.yaml")
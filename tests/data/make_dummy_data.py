@@ -6,9 +6,8 @@ from __future__ import annotations
 import string
 
 import numpy as np
-from datasets import ClassLabel, Dataset
+from datasets import ClassLabel, Dataset, Features, Image
 from dummy_config import config
-from PIL import Image
 
 test_seed = config["test_seed"]
 rng = np.random.default_rng(test_seed)
@@ -20,28 +19,37 @@ img_bits = config["img_bits"]
 
 # Note: PIL expects colour channel to be last. After processing with HuggingFace
 # defaults this will be converted to first.
-img_array = rng.integers(
-    0, 2**img_bits, (n_images, image_size, image_size, num_channels)
+img_array = np.ascontiguousarray(
+    rng.integers(
+        0,
+        2**img_bits,
+        (n_images, image_size, image_size, num_channels),
+        dtype=np.uint8,
+    )
 )
-img_PIL = [Image.fromarray(img, mode="RGB") for img in img_array]
 
 n_classes = config["n_classes"]
 names = list(string.ascii_lowercase)[:n_classes]
-labels = rng.choice(names, n_images)
+label_ids = rng.integers(0, n_classes, n_images, dtype=np.int32)
 
+# the Image feature encodes the uint8 arrays directly, without creating PIL images.
+# "label" is a ClassLabel feature, which provides functionality for converting between
+# class names and indices and is the expected input format for locomoset functions
 dataset = Dataset.from_dict(
     mapping={
-        "image": img_PIL,
-        "label": labels,
+        "image": list(img_array),
+        "label": label_ids,
     },
+    features=Features({"image": Image(), "label": ClassLabel(names=names)}),
 )
 
-# convert "label" feature to ClassLabel, which provides functionality for converting
-# between class names and indices and is the expected input format for locomoset
-# functions
-dataset = dataset.cast_column("label", ClassLabel(names=names))
-
 # Note: Not using dataset.save_to_disk() here, because then HuggingFace wants you to use
 # Dataset.load_from_disk() instead of Dataset.load_dataset(), see
 # https://github.com/huggingface/datasets/issues/5044.
-dataset.to_parquet("dummy_dataset/dummy_dataset.parquet")
+# The dataset is small enough to write as a single (zstd compressed) row group.
+dataset.to_parquet(
+    "dummy_dataset/dummy_dataset.parquet",
+    batch_size=max(1, n_images),
+    compression="zstd",
+    compression_level=3,
+)
@@ -7,7 +7,8 @@ import os
 
 import yaml
 
-from locomoset.metrics.classes import TopLevelMetricConfig
+from locomoset.config.config_classes import load_yaml
+from locomoset.metrics.classes import MetricConfig, TopLevelMetricConfig
 from locomoset.models.classes import TopLevelFineTuningConfig
 
 
@@ -75,3 +76,19 @@ def test_bask_script_creation_training(dummy_top_level_config, test_n_samples):
     )
     assert bask_script["array_number"] == str(test_n_samples)
     assert bask_script["config_type"] == str(config.config_type)
+
+
+def test_load_yaml(tmp_path, dummy_top_level_config):
+    path = tmp_path / "config.yaml"
+    with open(path, "w") as f:
+        yaml.safe_dump(dummy_top_level_config, f)
+    assert load_yaml(path) == dummy_top_level_config
+
+
+def test_disable_preprocess_cache(dummy_metric_config):
+    metric_config = MetricConfig.from_dict(dummy_metric_config)
+    assert metric_config.disable_preprocess_cache is False
+    assert "disable_preprocess_cache" not in metric_config.to_dict()
+
+    dummy_metric_config["caches"]["preprocess_cache"] = "tmp"
+    assert MetricConfig.from_dict(dummy_metric_config).disable_preprocess_cache
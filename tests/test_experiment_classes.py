@@ -4,11 +4,26 @@
 """
 from __future__ import annotations
 
+import json
+from copy import deepcopy
+
+import numpy as np
+import pytest
 from transformers import PreTrainedModel
 
 from locomoset.config.config_classes import create_wandb_names
+from locomoset.metrics import experiment
 from locomoset.metrics.classes import MetricConfig, TopLevelMetricConfig
-from locomoset.metrics.experiment import ModelMetricsExperiment
+from locomoset.metrics.experiment import (
+    ModelMetricsExperiment,
+    _load_model,
+    _results_key,
+    _results_to_builtin,
+    _select_batch,
+    clear_model_cache,
+    run_config,
+    run_configs,
+)
 from locomoset.models.load import get_model_without_head
 
 
@@ -57,6 +72,14 @@ def test_perform_inference_task_agnostic(dummy_metric_config):
     assert isinstance(inference[0], PreTrainedModel)
 
 
+def test_model_cache(dummy_model_name):
+    """Test models are reused until the cache is cleared"""
+    model = _load_model(dummy_model_name)
+    assert _load_model(dummy_model_name) is model
+    clear_model_cache()
+    assert _load_model(dummy_model_name) is not model
+
+
 def test_compute_metric_score(dummy_metric_config):
     """Test the compute metric score method"""
     dummy_metric_config["metrics"] = ["n_pars"]
@@ -92,3 +115,135 @@ def test_top_level_metric_config_param_sweep(dummy_top_level_config, test_seed):
     assert len(config.sub_configs) == 2
     assert config.sub_configs[0].random_state == test_seed
     assert config.sub_configs[1].random_state == test_seed + 1
+
+
+def test_select_batch():
+    configs = list(range(10))
+    assert _select_batch(configs, "1/3") == [0, 3, 6, 9]
+    assert _select_batch(configs, "3/3") == [2, 5, 8]
+    assert _select_batch(configs, "1/1") == configs
+    with pytest.raises(ValueError):
+        _select_batch(configs, "0/3")
+
+
+def test_top_level_metric_config_joint_design(dummy_top_level_config, test_seed):
+    dummy_top_level_config["joint_design"] = [
+        {"random_state": test_seed, "n_samples": 50, "metrics_samples": 50},
+        {"random_state": test_seed + 1, "n_samples": 100, "metrics_samples": 50},
+    ]
+    config = TopLevelMetricConfig.from_dict(dummy_top_level_config)
+    config.generate_sub_configs()
+    assert len(config.sub_configs) == 2
+    assert config.sub_configs[0].random_state == test_seed
+    assert config.sub_configs[0].n_samples == 50
+    assert config.sub_configs[1].random_state == test_seed + 1
+    assert config.sub_configs[1].n_samples == 100
+
+    # random_states has multiple values so must be set in every entry
+    dummy_top_level_config["joint_design"] = [{"n_samples": 50}]
+    config = TopLevelMetricConfig.from_dict(dummy_top_level_config)
+    with pytest.raises(ValueError, match="random_state"):
+        config.generate_sub_configs()
+
+    # misspelt arguments aren't silently ignored
+    dummy_top_level_config["joint_design"] = [
+        {"random_state": test_seed, "n_sample": 70},
+        {"random_state": test_seed + 1, "modle_name": "x"},
+    ]
+    config = TopLevelMetricConfig.from_dict(dummy_top_level_config)
+    with pytest.raises(ValueError, match="n_sample"):
+        config.generate_sub_configs()
+
+
+def test_results_to_builtin():
+    results = {
+        "metric_scores": {"parc": {"score": np.float32(0.5), "time": 1.0}},
+        "n_pars": np.int64(10),
+        "list": [np.float64(1.5)],
+    }
+    builtin_results = _results_to_builtin(results)
+    assert builtin_results == results
+    score = builtin_results["metric_scores"]["parc"]["score"]
+    assert isinstance(score, float) and not isinstance(score, np.generic)
+    assert isinstance(builtin_results["n_pars"], int)
+    assert not isinstance(builtin_results["list"][0], np.generic)
+    json.dumps(builtin_results)
+
+
+def test_results_key(dummy_metric_config):
+    key = _results_key(MetricConfig.from_dict(dummy_metric_config))
+    dummy_metric_config["config_gen_dtime"] = "20000101-000000-000000"
+    assert _results_key(MetricConfig.from_dict(dummy_metric_config)) == key
+    dummy_metric_config["random_state"] += 1
+    assert _results_key(MetricConfig.from_dict(dummy_metric_config)) != key
+
+
+class DummyExperiment:
+    """Stand-in for ModelMetricsExperiment that records the configs it's run with."""
+
+    configs = []
+
+    def __init__(self, config):
+        self.configs.append(config)
+
+    def run_experiment(self):
+        pass
+
+    def save_results(self):
+        pass
+
+
+def test_run_config_saved_results(dummy_metric_config, tmp_path, monkeypatch):
+    dummy_metric_config["save_dir"] = str(tmp_path)
+    config = MetricConfig.from_dict(dummy_metric_config)
+    config.use_wandb = False
+    monkeypatch.setattr(experiment, "ModelMetricsExperiment", DummyExperiment)
+    monkeypatch.setattr(DummyExperiment, "configs", [])
+
+    # a truncated results file (e.g. from a killed job) is treated as missing
+    path = tmp_path / f"results_20000101-000000-1_0_{_results_key(config)}.json"
+    path.write_text('{"metric_scores": {')
+    with pytest.warns(UserWarning, match="unreadable"):
+        run_config(config)
+    assert DummyExperiment.configs == [config]
+
+    # valid saved results are loaded rather than the experiment being run again
+    path.write_text(json.dumps({"metric_scores": {}}))
+    run_config(config)
+    assert DummyExperiment.configs == [config]
+
+
+def test_save_results(tmp_path):
+    model_experiment = object.__new__(ModelMetricsExperiment)
+    model_experiment.save_dir = str(tmp_path)
+    model_experiment.save_path = str(tmp_path / "results.json")
+    model_experiment.results = {"metric_scores": {"parc": {"score": 0.5}}}
+    model_experiment.save_results()
+    assert [p.name for p in tmp_path.iterdir()] == ["results.json"]
+    with open(model_experiment.save_path) as f:
+        assert json.load(f) == model_experiment.results
+
+
+def test_run_configs(dummy_metric_config, monkeypatch):
+    configs = []
+    for idx, model_name in enumerate(["m1", "x", "m1", "x", "m2"]):
+        config_dict = deepcopy(dummy_metric_config)
+        config_dict["model_name"] = model_name
+        if idx == 4:
+            config_dict["caches"]["preprocess_cache"] = "tmp"
+        configs.append(MetricConfig.from_dict(config_dict))
+
+    calls = []
+    monkeypatch.setattr(experiment, "run_config", lambda c: calls.append(c.model_name))
+    monkeypatch.setattr(
+        experiment, "clear_model_cache", lambda: calls.append("clear_model_cache")
+    )
+    monkeypatch.setattr(
+        experiment.datasets, "disable_caching", lambda: calls.append("disable_caching")
+    )
+    monkeypatch.setitem(experiment._sweep_state, "model_name", None)
+
+    run_configs(configs, batch="1/2")
+    # only configs 0, 2 and 4 are in the batch, caching is disabled once for the
+    # whole sweep, and the cache is only cleared when the model changes
+    assert calls == ["disable_caching", "m1", "m1", "clear_model_cache", "m2"]
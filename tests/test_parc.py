@@ -5,31 +5,62 @@ from __future__ import annotations
 
 import numpy as np
 import pytest
-
-from locomoset.metrics.parc import PARCMetric, _feature_reduce, _lower_tri_arr
-
-
-def test_parc_class_perfect_features(dummy_features_perfect, dummy_labels, test_seed):
-    """Test PARC metric class for perfect features"""
-    metric = PARCMetric(random_state=test_seed, feat_red_dim=None, scale_features=False)
-    assert metric.metric_name == "parc"
-    assert metric.inference_type == "features"
-    assert metric.dataset_dependent is True
-    assert metric.fit_metric(dummy_features_perfect, dummy_labels) == pytest.approx(100)
+from sklearn.decomposition import PCA
+
+from locomoset.metrics.parc import (
+    PARCMetric,
+    _feature_reduce,
+    _feature_reduce_gpu,
+    _gpu_available,
+    _lower_tri_arr,
+    _lower_tri_arr_numba,
+)
+
+
+@pytest.fixture(scope="module")
+def parc(test_seed):
+    return PARCMetric(random_state=test_seed, feat_red_dim=None, scale_features=False)
+
+
+def test_parc_class(parc):
+    """Test PARC metric class attributes"""
+    assert parc.metric_name == "parc"
+    assert parc.inference_type == "features"
+    assert parc.dataset_dependent is True
+
+
+@pytest.mark.parametrize(
+    ("features_fixture", "expected", "abs_tol"),
+    [("dummy_features_perfect", 100, None), ("dummy_features_random", 0.0, 0.2)],
+)
+def test_parc_class_features(
+    parc, dummy_labels, request, features_fixture, expected, abs_tol
+):
+    """Test PARC metric class for perfect and random features"""
+    features = request.getfixturevalue(features_fixture)
+    assert parc.fit_metric(features, dummy_labels) == pytest.approx(
+        expected, abs=abs_tol
+    )
 
 
-def test_parc_class_random_features(dummy_features_random, dummy_labels, test_seed):
-    """Test PARC metric class for random features"""
-    metric = PARCMetric(random_state=test_seed, feat_red_dim=None, scale_features=False)
-    assert metric.metric_name == "parc"
-    assert metric.inference_type == "features"
-    assert metric.dataset_dependent is True
-    assert metric.fit_metric(dummy_features_random, dummy_labels) == pytest.approx(
-        0.0, abs=0.2
+def test_parc_class_features_standardized(
+    dummy_features_random, dummy_labels, test_seed
+):
+    """Test pre-standardized features give the same score without being rescaled"""
+    standardized = (
+        dummy_features_random - dummy_features_random.mean(axis=0)
+    ) / dummy_features_random.std(axis=0)
+    metric = PARCMetric(random_state=test_seed, feat_red_dim=2)
+    pre_scaled_metric = PARCMetric(
+        random_state=test_seed, feat_red_dim=2, features_standardized=True
+    )
+    assert pre_scaled_metric.fit_metric(standardized, dummy_labels) == pytest.approx(
+        metric.fit_metric(dummy_features_random, dummy_labels)
     )
 
 
-def test_lower_tri():
+@pytest.mark.parametrize("n", [5, 64, 1024])
+def test_lower_tri(n):
     """
     Test that the lower triangular values (offset from diag by one) values of a square
     matrix are being correctly pulled out.
@@ -37,17 +68,16 @@ def test_lower_tri():
     NB: This actually pulls out the upper triangular values but applies to a symmetric
     matrix by definition.
     """
-    n = 5
-
-    # create n^2 array of numbers from 1 -> 25
-    arr = np.array([i + 1 for i in range(n**2)]).reshape((n, n))
+    # create n^2 array of numbers from 1 -> n^2
+    arr = np.arange(1, n**2 + 1).reshape((n, n))
 
-    # analytical sum of upper triangular values for above matrix
-    s = (n**2 * (n**2 + 1)) / 2 - sum(
-        [(k * (k * (2 * n + 1) - 2 * n + 1)) / 2 for k in range(1, n + 1)]
-    )
+    # analytical sum of upper triangular values for above matrix: the sum of all values
+    # minus the sum of the lower triangle and diagonal, sum_k k(k(2n+1) - 2n + 1)/2
+    s = n**2 * (n**2 + 1) // 2 - n * (n + 1) * (2 * n**2 - n + 2) // 6
 
-    assert s == sum(_lower_tri_arr(arr))
+    assert s == _lower_tri_arr(arr).sum()
+    assert np.array_equal(_lower_tri_arr(arr), arr[np.triu_indices(n, 1)])
+    assert np.array_equal(_lower_tri_arr_numba(arr), arr[np.triu_indices(n, 1)])
 
 
 def test_feature_reduce(dummy_features_random, test_seed, rng, test_n_samples):
@@ -55,9 +85,10 @@ def test_feature_reduce(dummy_features_random, test_seed, rng, test_n_samples):
     Test that the feature reduction method:
         - returns the features if f = None is given
         - raises an exception if f > min(features.shape)
-        - returns the features with the correct shape if f < min(features.shape)
+        - returns the features with the correct shape and dtype if
+          f < min(features.shape)
     """
-    assert np.all(_feature_reduce(dummy_features_random, test_seed, None)) == np.all(
+    assert _feature_reduce(dummy_features_random, test_seed, None) is (
         dummy_features_random
     )
 
@@ -65,7 +96,48 @@ def test_feature_reduce(dummy_features_random, test_seed, rng, test_n_samples):
         _feature_reduce(dummy_features_random, test_seed, 10000)
 
     large_n_features = 100
-    features = rng.normal(size=(test_n_samples, large_n_features))
+    features = rng.standard_normal((test_n_samples, large_n_features), np.float32)
     red_dim = 32
     red_features = _feature_reduce(features, test_seed, f=red_dim)
     assert red_features.shape == (test_n_samples, red_dim)
+    assert red_features.dtype == np.float32
+
+
+def test_feature_reduce_exact(dummy_features_random, test_seed, test_n_features):
+    """
+    Test that keeping (almost) all components gives the same features as an exact PCA
+    """
+    red_dim = test_n_features - 1
+    assert np.allclose(
+        _feature_reduce(dummy_features_random, test_seed, f=red_dim),
+        PCA(n_components=red_dim, svd_solver="full").fit_transform(
+            dummy_features_random
+        ),
+    )
+
+
+@pytest.mark.gpu()
+@pytest.mark.skipif(not _gpu_available(), reason="cuML and a CUDA device required")
+def test_feature_reduce_gpu(test_seed, rng, test_n_samples):
+    """Test that the GPU feature reduction returns features with the correct shape"""
+    features = rng.normal(size=(test_n_samples, 100))
+    red_features = _feature_reduce_gpu(features, test_seed, f=32)
+    assert isinstance(red_features, np.ndarray)
+    assert red_features.shape == (test_n_samples, 32)
+
+
+def test_feature_reduce_cache(dummy_features_random, test_seed):
+    """Test that reduced features are reused for identical inputs until cleared"""
+    PARCMetric.clear_cache()
+    red_features = _feature_reduce(dummy_features_random, test_seed, f=2)
+    assert _feature_reduce(dummy_features_random.copy(), test_seed, f=2) is red_features
+    other_seed_features = _feature_reduce(dummy_features_random, test_seed + 1, f=2)
+    assert other_seed_features is not red_features
+    centred_features = _feature_reduce(
+        dummy_features_random, test_seed, f=2, centred=True
+    )
+    assert centred_features is not red_features
+    PARCMetric.clear_cache()
+    new_red_features = _feature_reduce(dummy_features_random, test_seed, f=2)
+    assert new_red_features is not red_features
+    assert np.array_equal(new_red_features, red_features)
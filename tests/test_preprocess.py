@@ -4,11 +4,20 @@ from collections import Counter
 from math import isclose
 
 import numpy as np
-from datasets import ClassLabel, Dataset, DatasetDict, concatenate_datasets
+from datasets import (
+    ClassLabel,
+    Dataset,
+    DatasetDict,
+    concatenate_datasets,
+    load_dataset,
+)
 
+from locomoset.datasets.load import build_metric_dataset
 from locomoset.datasets.preprocess import (
     _encode_labels_dict,
     _encode_labels_single,
+    _nested_subset_indices,
+    _train_test_split_indices,
     create_data_splits,
     drop_images,
     drop_images_by_labels,
@@ -107,6 +116,73 @@ def test_drop_images_label_stratification(dummy_dataset):
     assert all(checks)
 
 
+def test_nested_subset_indices(dummy_dataset):
+    labels = dummy_dataset.with_format("numpy")["label"]
+    train_idx, metrics_idx = _nested_subset_indices(labels, sizes=[50, 25], seed=42)
+    assert len(train_idx) == 50
+    assert len(metrics_idx) == 25
+    assert set(metrics_idx) <= set(train_idx)
+    # None keeps the whole previous subset
+    train_idx, metrics_idx = _nested_subset_indices(labels, sizes=[None, 0.5], seed=42)
+    assert len(train_idx) == dummy_dataset.num_rows
+    assert len(metrics_idx) == dummy_dataset.num_rows * 0.5
+
+
+def test_train_test_split_indices(dummy_dataset, test_seed):
+    """
+    Test the split indices match those selected by Dataset.train_test_split
+    """
+    labels = dummy_dataset.with_format("numpy")["label"]
+    dataset = dummy_dataset.add_column("idx", range(dummy_dataset.num_rows))
+    for stratify_by_column in ["label", None]:
+        for size_kwargs in [{"train_size": 50}, {"test_size": 0.15}]:
+            exp_split = dataset.train_test_split(
+                seed=test_seed, stratify_by_column=stratify_by_column, **size_kwargs
+            )
+            train_idx, test_idx = _train_test_split_indices(
+                labels,
+                seed=test_seed,
+                stratify=stratify_by_column is not None,
+                **size_kwargs,
+            )
+            assert train_idx.tolist() == exp_split["train"]["idx"]
+            assert test_idx.tolist() == exp_split["test"]["idx"]
+
+
+def test_build_metric_dataset(dummy_dataset_name, test_seed):
+    dataset_args = {
+        "train_split": "train",
+        "val_split": "val",
+        "test_split": "test",
+        "val_size": 0.15,
+        "test_size": 0.15,
+        "keep_labels": None,
+        "image_field": "image",
+        "label_field": "label",
+    }
+    metric_dataset, labels = build_metric_dataset(
+        dummy_dataset_name, dataset_args, 50, 25, random_state=test_seed
+    )
+    assert metric_dataset.num_rows == 25
+    assert labels.tolist() == metric_dataset["label"]
+
+    # should match splitting and subsetting the dataset step by step
+    dataset = create_data_splits(
+        load_dataset(dummy_dataset_name),
+        train_split="train",
+        val_split="val",
+        test_split="test",
+        random_state=test_seed,
+        val_size=0.15,
+        test_size=0.15,
+    )["train"]
+    dataset = drop_images(dataset, keep_size=50, seed=test_seed)
+    dataset = drop_images(dataset, keep_size=25, seed=test_seed)
+    assert labels.tolist() == dataset["label"]
+    for img, exp_img in zip(metric_dataset["image"], dataset["image"], strict=True):
+        np.testing.assert_equal(np.asarray(img), np.asarray(exp_img))
+
+
 def test_drop_images_by_labels(dummy_dataset):
     keeps = [0, 1]
     new_dataset = drop_images_by_labels(dummy_dataset, keep_labels=keeps)